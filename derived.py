@@ -0,0 +1,403 @@
+import hashlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict, namedtuple
+from typing import Dict
+
+import numpy as np
+
+# Raw channel registered with an overlay. The digest identifies the contents of the
+# arrays so that derived results can be reused between overlays of the same test.
+SourceChannel = namedtuple("SourceChannel", [
+    "time", "data", "digest"
+])
+
+# Results of recently evaluated expressions, keyed by the expression, the digests of the
+# source channels it reads and the time window it was evaluated over. Least recently
+# used entries are evicted once there are more than cache_size of them.
+cache_size = 256
+_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+
+
+def make_source(channel_time, channel_data) -> SourceChannel:
+    channel_time = np.ascontiguousarray(channel_time, dtype=float)
+    channel_data = np.ascontiguousarray(channel_data, dtype=float)
+    if channel_time.shape != channel_data.shape:
+        raise ValueError(f"Time and data arrays have different shapes: {channel_time.shape} != {channel_data.shape}")
+    if np.any(np.diff(channel_time) <= 0):
+        raise ValueError("Channel timestamps must be strictly increasing")
+
+    digest = hashlib.blake2b(channel_time.tobytes(), digest_size=16)
+    digest.update(channel_data.tobytes())
+    return SourceChannel(time=channel_time, data=channel_data, digest=digest.hexdigest())
+
+
+def clear_cache():
+    _cache.clear()
+
+
+def _trim(time, data, start_time, end_time, pad=False):
+    # Channel times are monotonic, so the window can be found without a boolean mask
+    lo = np.searchsorted(time, start_time, side="left")
+    hi = np.searchsorted(time, end_time, side="right")
+    if pad:
+        lo, hi = max(lo - 1, 0), min(hi + 1, len(time))
+    return time[lo:hi], data[lo:hi]
+
+
+def _finite(time, data):
+    # Drop dropouts so recurrences and running sums carry on across them
+    finite = np.isfinite(data)
+    if finite.all():
+        return time, data
+    return time[finite], data[finite]
+
+
+class Expression(ABC):
+    """
+    A quantity computed from one or more source channels.
+
+    Expressions are built up declaratively, e.g. ``MovingAverage(Source("PTX103"), 0.05)``
+    or ``Source("M730") + Source("M801")``, and evaluated only over the window that is
+    being rendered. Results are memoised, so reusing an expression (or part of one) with
+    the same source data costs nothing.
+    """
+
+    @abstractmethod
+    def key(self) -> tuple:
+        """Hashable description of the expression, used for memoisation."""
+
+    @abstractmethod
+    def source_names(self) -> frozenset:
+        """Names of the source channels the expression reads."""
+
+    def input_start(self, start_time: float) -> float:
+        """Earliest time that the inputs of this expression are needed from."""
+        return start_time
+
+    @abstractmethod
+    def _compute(self, sources, start_time, end_time, origin):
+        """Return ``(time, data)`` covering at least ``start_time`` to ``end_time``."""
+
+    def evaluate(self, sources: Dict[str, SourceChannel], start_time: float, end_time: float, origin: float = None,
+                 pad: bool = False):
+        """
+        Evaluate over ``start_time`` to ``end_time``.
+
+        ``origin`` is the start of the render window. Parents may ask for data from before
+        it, but it stays fixed so that quantities like integrals have the same zero point
+        wherever they appear in an expression. Defaults to ``start_time``.
+
+        With ``pad``, one sample either side of the window is kept where available, so a
+        parent that interpolates has data to interpolate from right up to the window edges.
+        """
+        if origin is None:
+            origin = start_time
+
+        missing = self.source_names() - sources.keys()
+        if missing:
+            raise ValueError(f"Expression refers to unknown source channels: {sorted(missing)}")
+
+        cache_key = (
+            self.key(),
+            tuple(sources[name].digest for name in sorted(self.source_names())),
+            start_time,
+            end_time,
+            origin,
+            pad,
+        )
+        if cache_key in _cache:
+            _cache.move_to_end(cache_key)
+            return _cache[cache_key]
+
+        time, data = self._compute(sources, start_time, end_time, origin)
+        # Copy so that cached results don't keep whole source logs alive as views, and make
+        # them read-only since the same arrays are handed to every later caller
+        result = tuple(array.copy() for array in _trim(time, data, start_time, end_time, pad))
+        for array in result:
+            array.setflags(write=False)
+        _cache[cache_key] = result
+        while len(_cache) > cache_size:
+            _cache.popitem(last=False)
+        return result
+
+    def __add__(self, other):
+        if isinstance(other, Expression):
+            return BinaryOp("add", self, other)
+        return Scale(self, offset=other)
+
+    def __radd__(self, other):
+        return self + other
+
+    def __sub__(self, other):
+        if isinstance(other, Expression):
+            return BinaryOp("sub", self, other)
+        return Scale(self, offset=-other)
+
+    def __rsub__(self, other):
+        return Scale(self, factor=-1, offset=other)
+
+    def __mul__(self, other):
+        if isinstance(other, Expression):
+            return BinaryOp("mul", self, other)
+        return Scale(self, factor=other)
+
+    def __rmul__(self, other):
+        return self * other
+
+    def __truediv__(self, other):
+        if isinstance(other, Expression):
+            return BinaryOp("div", self, other)
+        if other == 0:
+            raise ValueError("Cannot divide an expression by zero")
+        return Scale(self, factor=1 / other)
+
+    def __rtruediv__(self, other):
+        return Scale(Reciprocal(self), factor=other)
+
+    def __neg__(self):
+        return Scale(self, factor=-1)
+
+
+class Source(Expression):
+    """A raw channel, looked up by the name it was registered with."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def key(self):
+        return ("source", self.name)
+
+    def source_names(self):
+        return frozenset([self.name])
+
+    def _compute(self, sources, start_time, end_time, origin):
+        source = sources[self.name]
+        return source.time, source.data
+
+
+class _UnaryExpression(Expression):
+    def __init__(self, expression: Expression):
+        self.expression = expression
+
+    def source_names(self):
+        return self.expression.source_names()
+
+    def _input(self, sources, start_time, end_time, origin):
+        return self.expression.evaluate(sources, self.input_start(start_time), end_time, origin, pad=True)
+
+
+class Scale(_UnaryExpression):
+    """Unit conversion: ``data * factor + offset``."""
+
+    def __init__(self, expression: Expression, factor: float = 1.0, offset: float = 0.0):
+        if not (np.isfinite(factor) and np.isfinite(offset)):
+            raise ValueError(f"Scale factor and offset must be finite: {factor}, {offset}")
+        super().__init__(expression)
+        self.factor = float(factor)
+        self.offset = float(offset)
+
+    def key(self):
+        return ("scale", self.expression.key(), self.factor, self.offset)
+
+    def _compute(self, sources, start_time, end_time, origin):
+        time, data = self._input(sources, start_time, end_time, origin)
+        return time, data * self.factor + self.offset
+
+
+class Reciprocal(_UnaryExpression):
+    """``1 / data``, e.g. for converting a period into a frequency."""
+
+    def key(self):
+        return ("reciprocal", self.expression.key())
+
+    def _compute(self, sources, start_time, end_time, origin):
+        time, data = self._input(sources, start_time, end_time, origin)
+        with np.errstate(divide="ignore"):
+            return time, 1 / data
+
+
+class Resample(_UnaryExpression):
+    """
+    Linearly interpolate onto a uniform timebase of ``rate`` samples per second.
+
+    The grid is aligned to the start of the render window, so resampled channels line up
+    with each other and with the video frames.
+    """
+
+    def __init__(self, expression: Expression, rate: float):
+        if not rate > 0:
+            raise ValueError(f"Resample rate must be positive: {rate}")
+        super().__init__(expression)
+        self.rate = float(rate)
+
+    def key(self):
+        return ("resample", self.expression.key(), self.rate)
+
+    def _compute(self, sources, start_time, end_time, origin):
+        time, data = self._input(sources, start_time, end_time, origin)
+        # One grid point beyond each end so that a padded result reaches past the window.
+        # The tolerance stops rounding error from dropping points that lie on the window edges.
+        first = np.ceil((start_time - origin) * self.rate - 1e-6) - 1
+        last = np.floor((end_time - origin) * self.rate + 1e-6) + 1
+        new_time = origin + np.arange(first, last + 1) / self.rate
+        if len(time) == 0:
+            return new_time[:0], data[:0]
+        new_time = new_time[(time[0] <= new_time) & (new_time <= time[-1])]
+        return new_time, np.interp(new_time, time, data)
+
+
+class MovingAverage(_UnaryExpression):
+    """Mean of the finite samples in the preceding ``window`` seconds. Works on irregularly sampled channels."""
+
+    def __init__(self, expression: Expression, window: float):
+        if not window > 0:
+            raise ValueError(f"MovingAverage window must be positive: {window}")
+        super().__init__(expression)
+        self.window = float(window)
+
+    def key(self):
+        return ("moving_average", self.expression.key(), self.window)
+
+    def input_start(self, start_time):
+        return start_time - self.window
+
+    def _compute(self, sources, start_time, end_time, origin):
+        time, data = self._input(sources, start_time, end_time, origin)
+        # Count only finite samples so a dropout affects just the window that contains it
+        finite = np.isfinite(data)
+        cumulative = np.concatenate(([0.0], np.cumsum(np.where(finite, data, 0.0))))
+        count = np.concatenate(([0], np.cumsum(finite)))
+        right = np.arange(1, len(time) + 1)
+        left = np.searchsorted(time, time - self.window, side="left")
+        samples = count[right] - count[left]
+        total = cumulative[right] - cumulative[left]
+        mean = np.divide(total, samples, out=np.full(len(time), np.nan), where=samples > 0)
+        return time, mean
+
+
+class LowPass(_UnaryExpression):
+    """
+    Causal first-order (single-pole RC) low-pass filter with a cutoff of ``cutoff`` Hz.
+
+    The input is held between samples and the filter is stepped exactly across each
+    sample interval, so irregularly sampled channels need no resampling. Being causal,
+    the output never reacts before the event it follows. Non-finite samples are skipped.
+    """
+
+    # Blocks of the recurrence are limited to this many time constants so the
+    # exponential weights stay well inside floating point range
+    block_time_constants = 50
+
+    def __init__(self, expression: Expression, cutoff: float):
+        if not cutoff > 0:
+            raise ValueError(f"LowPass cutoff must be positive: {cutoff}")
+        super().__init__(expression)
+        self.cutoff = float(cutoff)
+        self.time_constant = 1 / (2 * np.pi * self.cutoff)
+
+    def key(self):
+        return ("low_pass", self.expression.key(), self.cutoff)
+
+    def input_start(self, start_time):
+        # Ten time constants of settling leaves less than 0.01% of the initial state
+        return start_time - 10 * self.time_constant
+
+    def _compute(self, sources, start_time, end_time, origin):
+        time, data = _finite(*self._input(sources, start_time, end_time, origin))
+        if len(time) == 0:
+            return time, data
+
+        # y[n] = a[n] * y[n-1] + (1 - a[n]) * x[n] with a[n] = exp(-(t[n] - t[n-1]) / tau).
+        # Unrolled from a reference sample r this is
+        # y[n] = exp(-(t[n] - t[r]) / tau) * (y[r] + sum((1 - a[k]) * x[k] * exp((t[k] - t[r]) / tau)))
+        # which is evaluated a block at a time with cumsum.
+        tau = self.time_constant
+        intervals = np.diff(time)
+        decay = np.exp(-intervals / tau)
+        weights = -np.expm1(-intervals / tau) * data[1:]
+        filtered = np.empty_like(data)
+        filtered[0] = data[0]
+
+        block_length = self.block_time_constants * tau
+        reference = 0
+        while reference < len(time) - 1:
+            stop = np.searchsorted(time, time[reference] + block_length, side="right")
+            if stop <= reference + 1:
+                # A gap longer than a whole block, e.g. a logging dropout. Step across it
+                # directly; the unrolled form would overflow.
+                filtered[reference + 1] = decay[reference] * filtered[reference] + weights[reference]
+                reference += 1
+                continue
+            elapsed = (time[reference + 1:stop] - time[reference]) / tau
+            accumulated = filtered[reference] + np.cumsum(weights[reference:stop - 1] * np.exp(elapsed))
+            filtered[reference + 1:stop] = np.exp(-elapsed) * accumulated
+            reference = stop - 1
+
+        return time, filtered
+
+
+class Integrate(_UnaryExpression):
+    """
+    Cumulative trapezoidal integral, e.g. total impulse from thrust.
+
+    The integral is zero at ``from_time``, or at the start of the render window if that
+    is not given, and negative before it. Non-finite samples are skipped, so the area
+    across a dropout is interpolated from the samples either side.
+    """
+
+    def __init__(self, expression: Expression, from_time: float = None):
+        super().__init__(expression)
+        self.from_time = from_time
+
+    def key(self):
+        return ("integrate", self.expression.key(), self.from_time)
+
+    def _zero_time(self, origin):
+        return origin if self.from_time is None else self.from_time
+
+    def _compute(self, sources, start_time, end_time, origin):
+        zero_time = self._zero_time(origin)
+        time, data = _finite(*self.expression.evaluate(sources, min(start_time, zero_time), end_time, origin, pad=True))
+        if len(time) == 0:
+            return time, data
+        areas = 0.5 * (data[1:] + data[:-1]) * np.diff(time)
+        integral = np.concatenate(([0.0], np.cumsum(areas)))
+        return time, integral - np.interp(zero_time, time, integral)
+
+
+class BinaryOp(Expression):
+    """
+    Arithmetic between two expressions, on the timebase of the left-hand side.
+
+    The result is NaN wherever the right-hand side has no data to interpolate from.
+    """
+
+    operations = {
+        "add": np.add,
+        "sub": np.subtract,
+        "mul": np.multiply,
+        "div": np.divide,
+    }
+
+    def __init__(self, operation: str, left: Expression, right: Expression):
+        if operation not in self.operations:
+            raise ValueError(f"Unknown operation: {operation}")
+        self.operation = operation
+        self.left = left
+        self.right = right
+
+    def key(self):
+        return (self.operation, self.left.key(), self.right.key())
+
+    def source_names(self):
+        return self.left.source_names() | self.right.source_names()
+
+    def _compute(self, sources, start_time, end_time, origin):
+        left_time, left_data = self.left.evaluate(sources, start_time, end_time, origin, pad=True)
+        right_time, right_data = self.right.evaluate(sources, start_time, end_time, origin, pad=True)
+        # Outside the right-hand channel there is nothing to combine with, so the result is missing
+        if len(right_time) == 0:
+            right_on_left = np.full(len(left_time), np.nan)
+        else:
+            right_on_left = np.interp(left_time, right_time, right_data, left=np.nan, right=np.nan)
+        return left_time, self.operations[self.operation](left_data, right_on_left)
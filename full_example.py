@@ -1,4 +1,5 @@
 from main import LineGraphVideoOverlay
+from derived import Source, Integrate, MovingAverage
 import h5py
 
 airborne_ID = "20250625-008"
@@ -67,4 +68,17 @@ create_video(
     title=f"{test_title}: Thrust"
 )
 
+overlay = LineGraphVideoOverlay(
+    video_file=video_file,
+    output_path=f"{output_folder}/{test_title} Derived.mp4",
+    data_time_at_video_start=data_time_at_video_start,
+    title=f"{test_title}: Total Mass Flow and Impulse",
+    ylabel="kg/s, kNs",
+)
+for channel_name in ['M730', 'M801', 'LC190']:
+    overlay.add_source(f["channels"][channel_name]["time"][:], f["channels"][channel_name]["data"][:], channel_name)
+overlay.add_derived_channel(MovingAverage(Source('M730') + Source('M801'), 0.05), "Total Mass Flow (kg/s)")
+overlay.add_derived_channel(Integrate(Source('LC190')) / 1000, "Total Impulse (kNs)")
+overlay.render_video()
+
 f.close()
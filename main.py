@@ -9,6 +9,7 @@ import numpy as np
 from typing import Callable, List
 import h5py
 from collections import namedtuple
+import derived
 
 logging.basicConfig(level=logging.INFO)
 matplotlib.use('Agg')
@@ -138,6 +139,7 @@ class LineGraphVideoOverlay(VideoOverlay):
         self.ylabel = ylabel
         self.ylim = ylim
         self.channels = []
+        self.sources = {}
 
     def add_channel(self, channel_time, channel_data, channel_label):
         new_line = self.ax.plot(
@@ -147,11 +149,26 @@ class LineGraphVideoOverlay(VideoOverlay):
 
         new_channel = LineGraphChannel(time=channel_time, data=channel_data, label=channel_label, line=new_line)
 
-        self.ylim_max = max(self.ylim_max, np.max(new_channel.data))
-        self.ylim_min = min(self.ylim_min, np.min(new_channel.data))
+        # Dropouts and divisions by zero shouldn't stretch the axes to infinity
+        finite_data = new_channel.data[np.isfinite(new_channel.data)]
+        if finite_data.size > 0:
+            self.ylim_max = max(self.ylim_max, np.max(finite_data))
+            self.ylim_min = min(self.ylim_min, np.min(finite_data))
 
         self.channels.append(new_channel)
 
+    def add_source(self, channel_time, channel_data, name):
+        """Register a raw channel for use in derived channels without plotting it."""
+        self.sources[name] = derived.make_source(channel_time, channel_data)
+
+    def add_derived_channel(self, expression: derived.Expression, channel_label):
+        """Plot a channel computed from registered sources, evaluated over the render window only."""
+        channel_time, channel_data = expression.evaluate(self.sources, self.start_time, self.end_time)
+        if len(channel_time) == 0:
+            raise ValueError(f"Derived channel {channel_label} has no data between "
+                             f"{self.start_time} and {self.end_time} seconds")
+        self.add_channel(channel_time, channel_data, channel_label)
+
     def update(self, frame):
         timeslice_start = self.data_time_at_video_start + (frame - 1) * self.interval
         timeslice_end = self.data_time_at_video_start + frame * self.interval
@@ -0,0 +1,308 @@
+import numpy as np
+import pytest
+
+import derived
+from derived import BinaryOp, Integrate, LowPass, MovingAverage, Resample, Scale, Source, make_source
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    derived.clear_cache()
+    yield
+    derived.clear_cache()
+
+
+def sources_for(**channels):
+    return {name: make_source(time, data) for name, (time, data) in channels.items()}
+
+
+def test_integrate_known_function():
+    time = np.linspace(-1, 3, 4001)
+    sources = sources_for(a=(time, 2 * time))
+
+    result_time, result = Integrate(Source("a")).evaluate(sources, 0, 2)
+
+    # Integral of 2t from the window start at 0
+    np.testing.assert_allclose(result, result_time ** 2, atol=1e-9)
+
+
+def test_integrate_zero_point_does_not_depend_on_parent():
+    time = np.linspace(-5, 5, 10001)
+    sources = sources_for(a=(time, np.full_like(time, 0.3)))
+
+    integral = Integrate(Source("a"))
+    averaged = MovingAverage(integral, 1.0)
+    result_time, result = integral.evaluate(sources, 0, 2)
+    averaged_time, averaged_result = averaged.evaluate(sources, 0, 2)
+
+    assert result[0] == pytest.approx(0.0)
+    # Mean of 0.3t over the second before each sample
+    np.testing.assert_allclose(averaged_result, 0.3 * (averaged_time - 0.5), atol=1e-3)
+
+
+def test_moving_average_at_window_start_uses_lookback():
+    time = np.arange(0, 10, 0.01)
+    sources = sources_for(a=(time, time))
+
+    result_time, result = MovingAverage(Source("a"), 1.0).evaluate(sources, 5, 6)
+
+    assert result_time[0] == pytest.approx(5.0)
+    # Samples 4.00 to 5.00 inclusive
+    assert result[0] == pytest.approx(4.5)
+
+
+def test_moving_average_nan_only_affects_its_window():
+    time = np.arange(0, 5.0005, 0.001)
+    data = np.ones_like(time)
+    data[100] = np.nan
+    sources = sources_for(a=(time, data))
+
+    result_time, result = MovingAverage(Source("a"), 0.05).evaluate(sources, 0, 5)
+
+    assert not np.any(np.isnan(result))
+    np.testing.assert_allclose(result, 1.0)
+
+
+def test_integrate_nan_is_skipped():
+    time = np.arange(0, 5.0005, 0.001)
+    data = np.ones_like(time)
+    data[100] = np.nan
+    sources = sources_for(a=(time, data))
+
+    result_time, result = Integrate(Source("a")).evaluate(sources, 0, 5)
+
+    assert not np.any(np.isnan(result))
+    np.testing.assert_allclose(result, result_time, atol=1e-9)
+
+
+def test_low_pass_nan_is_skipped():
+    time = np.arange(0, 5.0005, 0.001)
+    data = np.ones_like(time)
+    data[100] = np.nan
+    sources = sources_for(a=(time, data))
+
+    result_time, result = LowPass(Source("a"), 10.0).evaluate(sources, 0, 5)
+
+    assert not np.any(np.isnan(result))
+    np.testing.assert_allclose(result, 1.0)
+
+
+def test_low_pass_matches_first_order_step_response():
+    dt = 1e-4
+    time = np.arange(0, 4, dt)
+    sources = sources_for(a=(time, (time >= 2).astype(float)))
+    cutoff = 1.0
+    time_constant = 1 / (2 * np.pi * cutoff)
+
+    result_time, result = LowPass(Source("a"), cutoff).evaluate(sources, 1, 4)
+
+    expected = np.where(result_time >= 2, 1 - np.exp(-(result_time - 2) / time_constant), 0.0)
+    np.testing.assert_allclose(result, expected, atol=2 * dt / time_constant)
+    # Causal: nothing happens before the step
+    assert np.all(result[result_time < 2] == 0)
+
+
+def test_low_pass_window_matches_full_log():
+    time = np.arange(0, 10, 1e-3)
+    sources = sources_for(a=(time, np.sin(2 * np.pi * time)))
+    expression = LowPass(Source("a"), 1.0)
+
+    full_time, full = expression.evaluate(sources, 0, 10)
+    window_time, window = expression.evaluate(sources, 4, 6)
+
+    np.testing.assert_allclose(window, np.interp(window_time, full_time, full), atol=1e-4)
+
+
+def test_binary_op_interpolates_onto_left_timebase():
+    left_time = np.linspace(0, 1, 11)
+    right_time = np.linspace(0, 1, 4)
+    sources = sources_for(a=(left_time, left_time), b=(right_time, 3 * right_time))
+
+    result_time, result = BinaryOp("add", Source("a"), Source("b")).evaluate(sources, 0, 1)
+
+    np.testing.assert_array_equal(result_time, left_time)
+    np.testing.assert_allclose(result, 4 * left_time)
+
+
+def test_binary_op_is_missing_where_right_starts_late():
+    left_time = np.linspace(0, 10, 101)
+    right_time = np.linspace(5, 10, 51)
+    sources = sources_for(a=(left_time, np.ones_like(left_time)), b=(right_time, np.full_like(right_time, 7.0)))
+
+    result_time, result = (Source("a") + Source("b")).evaluate(sources, 0, 10)
+
+    assert np.all(np.isnan(result[result_time < 5]))
+    np.testing.assert_allclose(result[result_time >= 5], 8.0)
+
+
+def test_binary_op_with_empty_right_is_missing():
+    time = np.linspace(0, 1, 11)
+    sources = sources_for(a=(time, time), b=(time + 5, time))
+
+    result_time, result = (Source("a") * Source("b")).evaluate(sources, 0, 1)
+
+    np.testing.assert_array_equal(result_time, time)
+    assert np.all(np.isnan(result))
+
+
+def test_binary_op_interpolates_up_to_window_edges():
+    time = np.arange(0, 10, 0.1)
+    sources = sources_for(a=(time, time), b=(time + 0.05, time + 0.05))
+
+    result_time, result = (Source("a") - Source("b")).evaluate(sources, 2, 3)
+
+    np.testing.assert_allclose(result, 0.0, atol=1e-9)
+
+
+def test_number_divided_by_expression():
+    time = np.array([1.0, 2.0, 4.0])
+    sources = sources_for(a=(time, time))
+
+    result_time, result = (1 / Source("a")).evaluate(sources, 1, 4)
+
+    np.testing.assert_allclose(result, [1.0, 0.5, 0.25])
+
+
+def test_cache_hit_and_miss_on_changed_data():
+    time = np.linspace(0, 1, 101)
+    expression = MovingAverage(Source("a"), 0.1)
+    sources = sources_for(a=(time, time))
+
+    first = expression.evaluate(sources, 0, 1)
+    assert expression.evaluate(sources, 0, 1) is first
+
+    changed = sources_for(a=(time, 2 * time))
+    second = expression.evaluate(changed, 0, 1)
+    assert second is not first
+    np.testing.assert_allclose(second[1], 2 * first[1])
+
+
+def test_cached_results_are_read_only():
+    time = np.linspace(0, 1, 101)
+    sources = sources_for(a=(time, time))
+
+    result_time, result = (Source("a") * 2).evaluate(sources, 0, 1)
+
+    with pytest.raises(ValueError):
+        result[0] = 100.0
+    with pytest.raises(ValueError):
+        result_time[0] = 100.0
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(derived, "cache_size", 4)
+    time = np.linspace(0, 1, 101)
+    sources = sources_for(a=(time, time))
+
+    for end_time in np.linspace(0.1, 1, 10):
+        Source("a").evaluate(sources, 0, end_time)
+
+    assert len(derived._cache) == 4
+
+
+def test_duplicate_timestamps_rejected():
+    with pytest.raises(ValueError):
+        make_source([0.0, 1.0, 1.0, 2.0], [1.0, 2.0, 3.0, 4.0])
+
+
+def test_unknown_source_rejected():
+    with pytest.raises(ValueError):
+        Source("missing").evaluate({}, 0, 1)
+
+
+def test_low_pass_across_logging_gap():
+    time = np.concatenate((np.arange(0, 1, 1e-3), np.arange(4, 5, 1e-3)))
+    sources = sources_for(a=(time, np.ones_like(time)))
+
+    with np.errstate(over="raise", invalid="raise"):
+        result_time, result = LowPass(Source("a"), 50.0).evaluate(sources, 0, 5)
+
+    np.testing.assert_allclose(result, 1.0)
+
+
+def test_resample_keeps_grid_points_on_window_edges():
+    time = np.arange(0, 10, 0.1) + 0.05
+    sources = sources_for(b=(time, 2 * time))
+
+    result_time, result = Resample(Source("b"), 10).evaluate(sources, 2, 3)
+
+    np.testing.assert_allclose(result_time, np.linspace(2, 3, 11))
+    np.testing.assert_allclose(result, 2 * result_time)
+
+
+def test_scale_unit_conversion():
+    time = np.linspace(0, 1, 11)
+    sources = sources_for(a=(time, time))
+
+    # Bar to psi with a zero offset correction
+    result_time, result = Scale(Source("a"), factor=14.5038, offset=-1.0).evaluate(sources, 0, 1)
+
+    np.testing.assert_allclose(result, 14.5038 * time - 1.0)
+
+
+@pytest.mark.parametrize("build, expected", [
+    (lambda a: a + 2, lambda x: x + 2),
+    (lambda a: 2 + a, lambda x: x + 2),
+    (lambda a: a - 2, lambda x: x - 2),
+    (lambda a: 2 - a, lambda x: 2 - x),
+    (lambda a: a * 3, lambda x: 3 * x),
+    (lambda a: 3 * a, lambda x: 3 * x),
+    (lambda a: a / 4, lambda x: x / 4),
+    (lambda a: -a, lambda x: -x),
+])
+def test_arithmetic_with_numbers(build, expected):
+    time = np.linspace(1, 2, 11)
+    sources = sources_for(a=(time, time))
+
+    result_time, result = build(Source("a")).evaluate(sources, 1, 2)
+
+    np.testing.assert_allclose(result, expected(time))
+
+
+def test_resample_grid_is_aligned_to_origin_under_lookback():
+    time = np.linspace(0, 10, 1001)
+    sources = sources_for(a=(time, time))
+    resampled = Resample(Source("a"), 4)
+
+    averaged_time, averaged = MovingAverage(resampled, 0.3).evaluate(sources, 2.1, 3.1)
+
+    # Grid points are 2.1 + k / 4 regardless of the lookback the parent asked for, and the
+    # first window averages 1.85 and 2.1
+    np.testing.assert_allclose(averaged_time, [2.1, 2.35, 2.6, 2.85, 3.1])
+    assert averaged[0] == pytest.approx((1.85 + 2.1) / 2)
+
+
+def test_resample_stops_where_the_log_does():
+    time = np.linspace(0, 2.5, 251)
+    sources = sources_for(a=(time, time))
+
+    result_time, result = Resample(Source("a"), 2).evaluate(sources, 1, 4)
+
+    np.testing.assert_allclose(result_time, [1.0, 1.5, 2.0, 2.5])
+    np.testing.assert_allclose(result, result_time)
+
+
+def test_resample_of_difference_is_exact_at_edges():
+    time = np.arange(0, 10, 0.1)
+    sources = sources_for(a=(time, time), b=(time + 0.05, time + 0.05))
+
+    result_time, result = Resample(Source("a") - Source("b"), 10).evaluate(sources, 2, 3)
+
+    np.testing.assert_allclose(result_time, np.linspace(2, 3, 11))
+    np.testing.assert_allclose(result, 0.0, atol=1e-9)
+
+
+@pytest.mark.parametrize("build", [
+    lambda: LowPass(Source("a"), 0),
+    lambda: LowPass(Source("a"), -5),
+    lambda: Resample(Source("a"), 0),
+    lambda: Resample(Source("a"), -10),
+    lambda: MovingAverage(Source("a"), 0),
+    lambda: MovingAverage(Source("a"), -1),
+    lambda: Scale(Source("a"), factor=np.nan),
+    lambda: Source("a") / 0,
+    lambda: BinaryOp("pow", Source("a"), Source("b")),
+])
+def test_invalid_parameters_rejected(build):
+    with pytest.raises(ValueError):
+        build()
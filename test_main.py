@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("ffmpeg")
+pytest.importorskip("h5py")
+pytest.importorskip("matplotlib")
+
+import derived
+import main
+from derived import Reciprocal, Source
+
+
+@pytest.fixture
+def overlay(tmp_path, monkeypatch):
+    derived.clear_cache()
+    video_file = tmp_path / "input.mp4"
+    video_file.touch()
+    monkeypatch.setattr(main.ffmpeg_library, "probe", lambda path: {"streams": [{
+        "codec_type": "video",
+        "duration": "2.0",
+        "nb_frames": "120",
+        "coded_width": "300",
+        "coded_height": "150",
+    }]})
+    yield main.LineGraphVideoOverlay(
+        video_file=str(video_file),
+        output_path=str(tmp_path / "output.mp4"),
+        data_time_at_video_start=1.0,
+        title="Test",
+        ylabel="Value",
+    )
+    derived.clear_cache()
+
+
+def test_add_derived_channel_covers_render_window(overlay):
+    time = np.arange(0, 5, 0.01)
+    overlay.add_source(time, time, "a")
+    overlay.add_source(time, 2 * time, "b")
+
+    overlay.add_derived_channel(Source("a") + Source("b"), "Sum")
+
+    channel = overlay.channels[0]
+    assert channel.label == "Sum"
+    assert channel.time[0] == pytest.approx(1.0)
+    assert channel.time[-1] == pytest.approx(3.0)
+    np.testing.assert_allclose(channel.data, 3 * channel.time)
+    assert overlay.ylim_max == pytest.approx(9.0)
+
+
+def test_add_derived_channel_outside_log_raises(overlay):
+    time = np.arange(10, 20, 0.01)
+    overlay.add_source(time, time, "a")
+
+    with pytest.raises(ValueError, match="no data"):
+        overlay.add_derived_channel(Source("a"), "Late")
+
+
+def test_add_derived_channel_ignores_non_finite_values_for_ylim(overlay):
+    time = np.linspace(0, 4, 5)
+    overlay.add_source(time, time - 2, "a")
+
+    # 1 / 0 at t=2 gives inf
+    overlay.add_derived_channel(Reciprocal(Source("a")), "Reciprocal")
+
+    assert np.isinf(overlay.channels[0].data).any()
+    assert overlay.ylim_max == pytest.approx(1.0)
+    assert overlay.ylim_min == pytest.approx(-1.0)